@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Value
+
+import chess
+from stockfish import Stockfish
+
+from engine import (DIFFICULTY_SETTINGS, engine_profile, find_stockfish_path, fit_workers, pin_pool_worker,
+                    pool_map, stop_engine)
+from puzzles import open_truncated, write_checkpoint
+
+CHECKPOINT_EVERY = 1000  # results between checkpoint writes
+
+def parse_position(line):
+    # Full FEN (with move counters) or EPD with opcodes such as id / bm
+    parts = line.split()
+    if len(parts) >= 6 and parts[4].isdigit() and parts[5].isdigit():
+        return chess.Board(" ".join(parts[:6])), {}
+    board = chess.Board()
+    operations = board.set_epd(line)
+    return board, operations
+
+def read_positions(lines, checkpoint):
+    resume_next, resume_done = checkpoint.next, set(checkpoint.done)
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if index < resume_next or index in resume_done:
+            continue
+        if not line or line.startswith("#"):
+            # Nothing to analyse, but the checkpoint still has to move past it
+            checkpoint.mark(index)
+            continue
+        yield index, line
+
+worker_engine = None
+worker_nodes = 0
+worker_args = None
+
+def init_worker(path, depth, nodes, profile, counter):
+    pin_pool_worker(counter, profile["Threads"])
+    start_worker_engine(path, depth, nodes, profile)
+
+def start_worker_engine(path, depth, nodes, profile):
+    global worker_engine, worker_nodes, worker_args
+    worker_engine = Stockfish(path=path, depth=depth, parameters=profile)
+    worker_nodes = nodes
+    worker_args = (path, depth, nodes, profile)
+
+def restart_worker():
+    stop_engine(worker_engine)
+    start_worker_engine(*worker_args)
+
+def analyse(task):
+    index, line = task
+    result = {"index": index}
+    try:
+        board, operations = parse_position(line)
+    except ValueError as e:
+        result["input"] = line
+        result["error"] = str(e)
+        return result
+
+    result["fen"] = board.fen()
+    if "id" in operations:
+        result["id"] = operations["id"]
+    if not board.is_valid():
+        # Stockfish may crash on positions without kings, with the side not to move in check, etc.
+        result["error"] = f"invalid position ({board.status().name})"
+        return result
+
+    started = time.time()
+    try:
+        worker_engine.set_fen_position(board.fen())
+        top = worker_engine.get_top_moves(1, verbose=True, num_nodes=worker_nodes)
+    except Exception as e:
+        # One bad position must not end the run; the next task gets a fresh engine
+        result["error"] = f"engine error: {e}"
+        restart_worker()
+        return result
+    elapsed_ms = int((time.time() - started) * 1000)
+
+    if not top:
+        result.update(bestmove=None, score=None, depth=0, nodes=0, time_ms=elapsed_ms)
+        return result
+
+    best = top[0]
+    if best["Mate"] is not None:
+        score = {"mate": best["Mate"]}
+    else:
+        score = {"cp": best["Centipawn"]}
+    result.update(
+        bestmove=best["Move"],
+        score=score,
+        depth=reached_depth(worker_engine.raw_stockfish_output(worker_engine.get_top_moves)),
+        seldepth=best.get("SelectiveDepth"),
+        nodes=best.get("Nodes"),
+        time_ms=best.get("Time", elapsed_ms)
+    )
+    return result
+
+def reached_depth(lines):
+    # Depth of the search's last "info depth ..." line
+    for line in reversed(lines):
+        parts = line.split()
+        if parts[:1] == ["info"] and "depth" in parts:
+            return int(parts[parts.index("depth") + 1])
+    return None
+
+class Checkpoint:
+    # Everything below `next` is done, plus the scattered indices in `done`
+    # (bounded by the in-flight window) when results arrive out of order.
+    # out_size is how much of the output those results fill.
+    def __init__(self, path):
+        self.path = path
+        self.next = 0
+        self.done = set()
+        self.out_size = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.next = state["next"]
+            self.done = set(state["done"])
+            self.out_size = state["out_size"]
+
+    def mark(self, index):
+        self.done.add(index)
+        while self.next in self.done:
+            self.done.remove(self.next)
+            self.next += 1
+
+    def save(self, out):
+        out.flush()
+        if not self.path:
+            return
+        self.out_size = out.tell()
+        write_checkpoint(self.path, {"next": self.next, "done": sorted(self.done), "out_size": self.out_size})
+
+def run(source, out, workers, depth, nodes, difficulty, ordered, checkpoint):
+    engine_path = find_stockfish_path()
+    if engine_path is None:
+        print("Stockfish not found in any common locations.", file=sys.stderr)
+        return 1
+
+    workers = fit_workers(workers)
+    if not workers:
+        return 1
+
+    profile = engine_profile(difficulty, engines=workers)
+
+    written = 0
+    started = time.time()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(engine_path, depth, nodes, profile, Value("i", 0))) as executor:
+        for result in pool_map(executor, analyse, read_positions(source, checkpoint), workers * 4, ordered):
+            out.write((json.dumps(result) + "\n").encode())
+            checkpoint.mark(result["index"])
+            written += 1
+            if written % CHECKPOINT_EVERY == 0:
+                checkpoint.save(out)
+                rate = written / (time.time() - started)
+                print(f"{written} positions  {rate:.1f} pos/s", file=sys.stderr)
+
+    checkpoint.save(out)
+    print(f"Done: {written} positions in {time.time() - started:.1f}s", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse EPD/FEN positions with Stockfish and write JSONL")
+    parser.add_argument("input", nargs="?", default="-", help="EPD/FEN file, one position per line (default: stdin)")
+    parser.add_argument("-o", "--out", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-d", "--difficulty", default="Hard", choices=list(DIFFICULTY_SETTINGS))
+    parser.add_argument("--depth", type=int, help="search depth (default: the difficulty's depth)")
+    parser.add_argument("--nodes", type=int, default=0, help="search a fixed number of nodes instead of a depth")
+    parser.add_argument("--order", choices=["input", "completion"], default="input")
+    parser.add_argument("--checkpoint", help="resume file; reruns skip positions already written")
+    args = parser.parse_args(argv)
+    if args.checkpoint and not args.out:
+        parser.error("--checkpoint needs --out; stdout cannot be rewound on resume")
+
+    depth = args.depth or DIFFICULTY_SETTINGS[args.difficulty]["depth"]
+    checkpoint = Checkpoint(args.checkpoint)
+    source = sys.stdin if args.input == "-" else open(args.input)
+    if not args.out:
+        out = sys.stdout.buffer
+    else:
+        out = open_truncated(args.out, checkpoint.out_size)
+    try:
+        return run(source, out, args.workers, depth, args.nodes, args.difficulty,
+                   args.order == "input", checkpoint)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,23 @@
+import argparse
+import os
 import pygame
 import chess
 import random
 import time
+import threading
 from pygame.locals import *
 from stockfish import Stockfish
 import json
 from datetime import datetime
+from engine import STOCKFISH_PATHS, DIFFICULTY_SETTINGS, EngineAdmission, configure_engine
+from puzzles import PUZZLE_FILE, PuzzleFile
+from session import GameSession, TIMER_DURATION, MOVE_TIME_LIMIT
+from replay import spectate
+
+try:
+    import evaluate
+except ImportError:
+    evaluate = None
 
 pygame.init()
 
@@ -21,6 +33,7 @@ WIDTH, HEIGHT = 800, 800
 BOARD_SIZE = 640
 SQUARE_SIZE = BOARD_SIZE // 8
 INFO_PANEL_WIDTH = WIDTH - BOARD_SIZE
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))  # images/ and static/ live next to this file
 
 THEMES = {
     "Classic": {
@@ -40,14 +53,12 @@ THEMES = {
         "dark": (120, 120, 120)    # Dark gray
     }
 }
-current_theme = "Classic"
 
 # Colors
-LIGHT = (240, 240, 200)
-DARK = (100, 160, 80)
 HIGHLIGHT = (247, 247, 105, 150)
 LAST_MOVE = (247, 247, 105, 100)
 CHECK_RED = (255, 50, 50, 180)
+PREMOVE = (255, 140, 60, 130)
 POPUP_BG = (50, 50, 50, 220)
 POPUP_TEXT = (255, 255, 255)
 BUTTON_COLOR = (70, 95, 130)
@@ -56,36 +67,15 @@ BUTTON_TEXT = (255, 255, 255)
 PANEL_COLOR = (50, 50, 50)
 TEXT_COLOR = (255, 255, 255)
 
-TIMER_DURATION = 10 * 60  # 10 minutes in seconds
-MOVE_TIME_LIMIT = 30      
-
-DIFFICULTY_SETTINGS = {
-    "Easy": {
-        "skill_level": 5,
-        "depth": 8,
-        "random_factor": 0.3  
-    },
-    "Medium": {
-        "skill_level": 10,
-        "depth": 12,
-        "random_factor": 0.1  
-    },
-    "Hard": {
-        "skill_level": 15,
-        "depth": 16,
-        "random_factor": 0.0
-    }
-}
-
-def load_images():
+def load_images(square_size=SQUARE_SIZE):
     pieces = ["p", "r", "n", "b", "q", "k"]
     images = {}
     for piece in pieces:
         for color in ["w", "b"]:
             key = color + piece
             try:
-                img = pygame.image.load(f"images/{key}.png")
-                images[key] = pygame.transform.scale(img, (SQUARE_SIZE, SQUARE_SIZE))
+                img = pygame.image.load(os.path.join(ASSET_DIR, "images", f"{key}.png"))
+                images[key] = pygame.transform.scale(img, (square_size, square_size))
             except Exception as e:
                 print(f"Error loading image {key}: {e}")
                 font = pygame.font.SysFont("Arial", 36)
@@ -114,7 +104,7 @@ def load_sounds():
         loaded = False
         for path in paths:
             try:
-                sounds[sound_name] = pygame.mixer.Sound(path)
+                sounds[sound_name] = pygame.mixer.Sound(os.path.join(ASSET_DIR, path))
                 loaded = True
                 break
             except:
@@ -155,115 +145,127 @@ def load_sounds():
     
     return sounds
 
-# Initialize game
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Python Chess")
-images = load_images()
-sounds = load_sounds() if pygame.mixer and pygame.mixer.get_init() else {}
-print(f"Sound system status: {'Enabled' if sounds else 'Disabled'}")
-board = chess.Board()
-selected_square = None
-legal_moves = []
-last_move = None
-
-game_over = False
-show_popup = False
-popup_message = ""
-popup_buttons = []
-timer_start = None
-time_remaining = TIMER_DURATION
-move_start_time = None
-move_time_remaining = MOVE_TIME_LIMIT
-difficulty = "Medium"
-player_color = chess.WHITE
-game_history = []
-ai_thinking = False
-show_promotion_dialog = False
-promotion_square = None
 
-try:
-    # Try different possible paths for Stockfish
-    stockfish_paths = [
-        "stockfish.exe",
-        "stockfish",
-        "./stockfish.exe", 
-        "./stockfish",
-        "C:/Program Files/Stockfish/stockfish.exe",
-        "C:/Program Files (x86)/Stockfish/stockfish.exe"
-    ]
+# Initialize game
+screen = None
+images = {}
+sounds = {}
+stockfish = None
+engine_admission = EngineAdmission()
+engine_difficulty = None  # difficulty the engine was last configured for
+engine_lock = threading.Lock()  # held by whichever thread is talking to Stockfish
+spectator_out = None  # --spectate: file or FIFO the moves are streamed to
+spectator_thread = None
+
+def init_stockfish():
+    try:
+        # Try different possible paths for Stockfish
+        engine = None
+        for path in STOCKFISH_PATHS:
+            try:
+                engine = Stockfish(path=path)
+                # Test if stockfish is working
+                engine.set_position(["e2e4"])
+                engine.get_best_move()
+                print(f"Stockfish found at: {path}")
+                break
+            except:
+                engine = None
+                continue
     
-    stockfish = None
-    for path in stockfish_paths:
-        try:
-            stockfish = Stockfish(path=path)
-            # Test if stockfish is working
-            stockfish.set_position(["e2e4"])
-            stockfish.get_best_move()
-            print(f"Stockfish found at: {path}")
-            break
-        except:
-            continue
+        if not engine:
+            print("Stockfish not found in any common locations.")
+            print("You can still play, but moves will be random.")
+        return engine
     
-    if stockfish:
-        # Set initial difficulty
-        settings = DIFFICULTY_SETTINGS[difficulty]
-        stockfish.set_skill_level(settings["skill_level"])
-        stockfish.set_depth(settings["depth"])
-    else:
-        print("Stockfish not found in any common locations.")
-        print("You can still play, but moves will be random.")
-        stockfish = None
-        
-except Exception as e:
-    print(f"Error initializing Stockfish: {e}")
-    stockfish = None
+    except Exception as e:
+        print(f"Error initializing Stockfish: {e}")
+        return None
 
-def update_ai_difficulty():
-    if stockfish:
-        settings = DIFFICULTY_SETTINGS[difficulty]
-        stockfish.set_skill_level(settings["skill_level"])
-        stockfish.set_depth(settings["depth"])
+def init_resources():
+    global screen, images, sounds, stockfish
+    
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Python Chess")
+    images = load_images()
+    sounds = load_sounds() if pygame.mixer and pygame.mixer.get_init() else {}
+    print(f"Sound system status: {'Enabled' if sounds else 'Disabled'}")
+    stockfish = init_stockfish()
+
+def configure_ai(difficulty):
+    # Caller holds engine_lock
+    global engine_difficulty
+    engine_difficulty = difficulty
+    settings = DIFFICULTY_SETTINGS[difficulty]
+    if configure_engine(stockfish, difficulty, engine_admission) is None:
+        print("Engine memory budget too small; keeping Stockfish's default Hash")
+    stockfish.set_skill_level(settings["skill_level"])
+    stockfish.set_depth(settings["depth"])
+
+def update_ai_difficulty(session):
+    # A running search (possibly for an abandoned game) owns the engine; then
+    # the next search applies the new settings before it starts.
+    if stockfish and engine_lock.acquire(blocking=False):
+        try:
+            configure_ai(session.difficulty)
+        finally:
+            engine_lock.release()
 
-def draw_board():
-    global LIGHT, DARK
-    current_theme_colors = THEMES[current_theme]
-    LIGHT = current_theme_colors["light"]
-    DARK = current_theme_colors["dark"]
+def draw_board(session):
+    theme_colors = THEMES[session.theme]
+    light = theme_colors["light"]
+    dark = theme_colors["dark"]
+    
+    view_board = session.board
+    view_last_move = session.last_move
+    if session.review_ply is not None:
+        view_board = session.replay.board_at(session.review_ply)
+        view_last_move = session.replay.move_at(session.review_ply)
     
     # Chess board
     for rank in range(8):
         for file in range(8):
-            color = LIGHT if (rank + file) % 2 == 0 else DARK
+            color = light if (rank + file) % 2 == 0 else dark
             pygame.draw.rect(screen, color, (file * SQUARE_SIZE, rank * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
     
-    if last_move:
-        for square in [last_move.from_square, last_move.to_square]:
+    if view_last_move:
+        for square in [view_last_move.from_square, view_last_move.to_square]:
             file, rank = chess.square_file(square), chess.square_rank(square)
             s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
             s.fill(LAST_MOVE)
             screen.blit(s, (file * SQUARE_SIZE, (7 - rank) * SQUARE_SIZE))
     
-    if selected_square:
-        file, rank = chess.square_file(selected_square), chess.square_rank(selected_square)
+    if session.selected_square and session.review_ply is None:
+        file, rank = chess.square_file(session.selected_square), chess.square_rank(session.selected_square)
         s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
         s.fill(HIGHLIGHT)
         screen.blit(s, (file * SQUARE_SIZE, (7 - rank) * SQUARE_SIZE))
         
-        for move in legal_moves:
+        for move in session.legal_moves:
             file, rank = chess.square_file(move.to_square), chess.square_rank(move.to_square)
             s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
             s.fill((100, 255, 100, 100))
             screen.blit(s, (file * SQUARE_SIZE, (7 - rank) * SQUARE_SIZE))
     
-    if board.is_check():
-        king_square = board.king(board.turn)
+    if session.review_ply is None:
+        premove_squares = [session.premove_from] if session.premove_from is not None else []
+        for move in session.premoves:
+            premove_squares += [move.from_square, move.to_square]
+        for square in premove_squares:
+            file, rank = chess.square_file(square), chess.square_rank(square)
+            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+            s.fill(PREMOVE)
+            screen.blit(s, (file * SQUARE_SIZE, (7 - rank) * SQUARE_SIZE))
+    
+    if view_board.is_check():
+        king_square = view_board.king(view_board.turn)
         file, rank = chess.square_file(king_square), chess.square_rank(king_square)
         s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
         s.fill(CHECK_RED)
         screen.blit(s, (file * SQUARE_SIZE, (7 - rank) * SQUARE_SIZE))
     
     for square in chess.SQUARES:
-        piece = board.piece_at(square)
+        piece = view_board.piece_at(square)
         if piece:
             file, rank = chess.square_file(square), chess.square_rank(square)
             key = ("w" if piece.color == chess.WHITE else "b") + piece.symbol().lower()
@@ -272,44 +274,39 @@ def draw_board():
             else:
                 screen.blit(images[key], (file * SQUARE_SIZE + 15, (7 - rank) * SQUARE_SIZE + 10))
 
-def cycle_theme():
-    global current_theme, LIGHT, DARK
+def cycle_theme(session):
     theme_list = list(THEMES.keys())
-    current_index = theme_list.index(current_theme)
+    current_index = theme_list.index(session.theme)
     next_index = (current_index + 1) % len(theme_list)
-    current_theme = theme_list[next_index]
+    session.theme = theme_list[next_index]
     
-    theme_colors = THEMES[current_theme]
-    LIGHT = theme_colors["light"]
-    DARK = theme_colors["dark"]
-    
-    draw_board()
+    draw_board(session)
     pygame.display.flip()
     
-    show_settings()
+    show_settings(session)
 
-def cycle_difficulty():
-    global difficulty
+def cycle_difficulty(session):
     difficulties = list(DIFFICULTY_SETTINGS.keys())
-    current_index = difficulties.index(difficulty)
+    current_index = difficulties.index(session.difficulty)
     next_index = (current_index + 1) % len(difficulties)
-    difficulty = difficulties[next_index]
+    session.difficulty = difficulties[next_index]
     
-    update_ai_difficulty()
+    update_ai_difficulty(session)
     
-    show_settings()
+    show_settings(session)
     
-def draw_info_panel():
+def draw_info_panel(session):
+    board = session.board
     pygame.draw.rect(screen, PANEL_COLOR, (BOARD_SIZE, 0, INFO_PANEL_WIDTH, HEIGHT))
     
     font = pygame.font.SysFont("Arial", 24)
     small_font = pygame.font.SysFont("Arial", 18)
     
-    player_text = f"Playing as: {'White' if player_color == chess.WHITE else 'Black'}"
+    player_text = f"Playing as: {'White' if session.player_color == chess.WHITE else 'Black'}"
     text = font.render(player_text, True, TEXT_COLOR)
     screen.blit(text, (BOARD_SIZE + 20, 20))
     
-    difficulty_text = f"Difficulty: {difficulty}"
+    difficulty_text = f"Difficulty: {session.difficulty}"
     text = font.render(difficulty_text, True, TEXT_COLOR)
     screen.blit(text, (BOARD_SIZE + 20, 50))
 
@@ -330,26 +327,26 @@ def draw_info_panel():
     text = font.render(status_text, True, TEXT_COLOR)
     screen.blit(text, (BOARD_SIZE + 20, 80))
 
-    if timer_start is not None and not game_over:
-        elapsed = time.time() - timer_start
-        remaining = max(0, time_remaining - elapsed)
+    if session.timer_start is not None and not session.game_over:
+        elapsed = time.time() - session.timer_start
+        remaining = max(0, session.time_remaining - elapsed)
         minutes = int(remaining // 60)
         seconds = int(remaining % 60)
     else:
-        minutes = int(time_remaining // 60)
-        seconds = int(time_remaining % 60)
+        minutes = int(session.time_remaining // 60)
+        seconds = int(session.time_remaining % 60)
     
     timer_text = f"Game Time: {minutes:02d}:{seconds:02d}"
     text = font.render(timer_text, True, TEXT_COLOR)
     screen.blit(text, (BOARD_SIZE + 20, 120))
     
-    if move_start_time is not None and not game_over:
-        elapsed = time.time() - move_start_time
-        remaining = max(0, move_time_remaining - elapsed)
+    if session.move_start_time is not None and not session.game_over:
+        elapsed = time.time() - session.move_start_time
+        remaining = max(0, session.move_time_remaining - elapsed)
         seconds = int(remaining)
         milliseconds = int((remaining - seconds) * 1000)
     else:
-        seconds = int(move_time_remaining)
+        seconds = int(session.move_time_remaining)
         milliseconds = 0
     
     move_timer_text = f"Move Time: {seconds:02d}.{milliseconds:03d}"
@@ -358,16 +355,24 @@ def draw_info_panel():
     screen.blit(text, (BOARD_SIZE + 20, 150))
     
     # Move history (last 5 moves)
-    if game_history:
+    if session.moves:
         history_text = "Move History:"
         text = small_font.render(history_text, True, TEXT_COLOR)
         screen.blit(text, (BOARD_SIZE + 20, 200))
         
-        for i, move in enumerate(game_history[-5:]):
+        for i, move in enumerate(session.history(last=5)):
             move_text = f"{i+1}. {move}"
             text = small_font.render(move_text, True, TEXT_COLOR)
             screen.blit(text, (BOARD_SIZE + 20, 230 + i * 25))
     
+    if session.review_ply is not None:
+        review_text = f"Reviewing: {session.review_ply}/{len(session.moves)}"
+        text = small_font.render(review_text, True, TEXT_COLOR)
+        screen.blit(text, (BOARD_SIZE + 20, 365))
+    
+    if evaluate is not None:
+        draw_eval_bar(board, small_font, BOARD_SIZE + 20, 400)
+    
     button_width, button_height = 150, 40
     button_y = HEIGHT - 200
     
@@ -389,11 +394,22 @@ def draw_info_panel():
     screen.blit(text, (BOARD_SIZE + 20 + (button_width - text.get_width()) // 2, 
                          button_y + 120 + (button_height - text.get_height()) // 2))
     
-def draw_promotion_dialog():
-    if not show_promotion_dialog or not promotion_square:
+def draw_eval_bar(board, font, x, y, width=150, height=14):
+    # Static evaluation only; instant, but blind to tactics
+    score = int(evaluate.evaluate_boards([board])[0])
+    text = font.render(f"Eval: {score / 100:+.2f}", True, TEXT_COLOR)
+    screen.blit(text, (x, y))
+    
+    white_share = 1 / (1 + 10 ** (-score / 400))
+    pygame.draw.rect(screen, (40, 40, 40), (x, y + 25, width, height))
+    pygame.draw.rect(screen, (235, 235, 235), (x, y + 25, int(width * white_share), height))
+    pygame.draw.rect(screen, (120, 120, 120), (x, y + 25, width, height), 1)
+
+def draw_promotion_dialog(session):
+    if not session.show_promotion_dialog or not session.promotion_square:
         return
     
-    file, rank = chess.square_file(promotion_square), chess.square_rank(promotion_square)
+    file, rank = chess.square_file(session.promotion_square), chess.square_rank(session.promotion_square)
     x = file * SQUARE_SIZE
     y = (7 - rank) * SQUARE_SIZE
     
@@ -402,7 +418,7 @@ def draw_promotion_dialog():
     
     pieces = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
     for i, piece in enumerate(pieces):
-        key = "w" + chess.piece_symbol(piece).lower() if board.turn == chess.WHITE else "b" + chess.piece_symbol(piece).lower()
+        key = "w" + chess.piece_symbol(piece).lower() if session.board.turn == chess.WHITE else "b" + chess.piece_symbol(piece).lower()
         screen.blit(images[key], (x, y + i * SQUARE_SIZE))
 
 def square_at_pos(pos):
@@ -413,7 +429,7 @@ def square_at_pos(pos):
     rank = 7 - (y // SQUARE_SIZE)
     return chess.square(file, rank)
 
-def play_sound(move):
+def play_sound(board, move):
     if not sounds:
         return
     
@@ -439,26 +455,148 @@ def play_sound(move):
     except Exception as e:
         print(f"Error playing sound: {e}")
 
-def get_ai_move():
-    if stockfish:
-        stockfish.set_fen_position(board.fen())
+def get_ai_move(board, difficulty, engine=None):
+    engine = engine or stockfish
+    if engine:
+        engine.set_fen_position(board.fen())
         
         settings = DIFFICULTY_SETTINGS[difficulty]
         
         if random.random() < settings["random_factor"]:
             return random.choice(list(board.legal_moves))
         
-        best_move = stockfish.get_best_move()
+        best_move = engine.get_best_move()
         if best_move:
             return chess.Move.from_uci(best_move)
         else:
-            return random.choice(list(board.legal_moves))
+            return fallback_move(board)
     else:
-        return random.choice(list(board.legal_moves))
+        return fallback_move(board)
 
-def draw_popup(message, buttons=None):
+def fallback_move(board):
+    # Without an engine answer, play the statically best move when NumPy is available
+    moves = list(board.legal_moves)
+    if evaluate is None:
+        return random.choice(moves)
+    return evaluate.order_moves(board, moves)[0]
+
+def start_ai_move(session):
+    position = session.board.copy(stack=False)
+    difficulty = session.difficulty
+    generation = session.generation
+    
+    def search():
+        try:
+            with engine_lock:
+                if session.generation != generation:
+                    # The game was restarted while this search waited for the engine
+                    threading.current_thread().result = None
+                    return
+                if stockfish and engine_difficulty != difficulty:
+                    configure_ai(difficulty)
+                threading.current_thread().result = get_ai_move(position, difficulty)
+        except Exception as e:
+            print(f"Error getting AI move: {e}")
+            threading.current_thread().result = None
+    
+    # The board is left untouched until the search lands; clicks meanwhile become premoves
+    session.ai_thinking = True
+    session.ai_thread = threading.Thread(target=search, daemon=True)
+    session.ai_thread.start()
+
+def apply_ai_move(session):
+    if not session.ai_thinking or session.ai_thread is None or session.ai_thread.is_alive():
+        return
+    
+    board = session.board
+    ai_move = session.ai_thread.result
+    if ai_move is None or ai_move not in board.legal_moves:
+        ai_move = random.choice(list(board.legal_moves))
+    session.ai_thread = None
+    session.ai_thinking = False
+    
+    # Gave up or ran out of time while the search was running
+    if session.game_over:
+        session.premoves.clear()
+        session.premove_from = None
+        return
+    
+    session.push(ai_move)
+    play_sound(board, ai_move)
+    session.move_start_time = time.time()
+    
+    if board.is_game_over():
+        session.game_over = True
+        if board.is_checkmate():
+            session.popup_message = "Checkmate!\nAI wins"
+        else:
+            session.popup_message = "Game Over!\nDraw"
+        session.show_popup = True
+        session.premoves.clear()
+        session.premove_from = None
+        return
+    
+    # A half-entered premove carries over as a normal selection
+    if session.premove_from is not None and not session.premoves:
+        session.selected_square = session.premove_from
+        session.legal_moves = [move for move in board.legal_moves if move.from_square == session.premove_from]
+    session.premove_from = None
+    
+    if session.premoves:
+        move = session.premoves.pop(0)
+        if move in board.legal_moves:
+            make_player_move(session, move)
+        else:
+            # Once one premove is illegal the rest of the queue no longer makes sense
+            session.premoves.clear()
+
+def make_player_move(session, move):
+    board = session.board
+    session.push(move)
+    play_sound(board, move)
+    session.move_start_time = time.time()
+    
+    if board.is_game_over():
+        session.game_over = True
+        if board.is_checkmate():
+            session.popup_message = "Checkmate!\nYou win!"
+        else:
+            session.popup_message = "Game Over!\nDraw"
+        session.show_popup = True
+        session.premoves.clear()
+    else:
+        start_ai_move(session)
+
+def premove_board(session):
+    # Player's pieces as they will stand once the queued premoves are played
+    position = session.board.copy(stack=False)
+    for move in session.premoves:
+        piece = position.remove_piece_at(move.from_square)
+        if piece:
+            if move.promotion:
+                piece = chess.Piece(move.promotion, piece.color)
+            position.set_piece_at(move.to_square, piece)
+    return position
+
+def queue_premove(session, square):
+    position = premove_board(session)
+    piece = position.piece_at(square)
+    own_piece = piece is not None and piece.color == session.player_color
+    if session.premove_from is None or own_piece:
+        session.premove_from = square if own_piece else None
+        return
+    
+    move = chess.Move(session.premove_from, square)
+    moving = position.piece_at(session.premove_from)
+    if moving.piece_type == chess.PAWN and chess.square_rank(square) in [0, 7]:
+        move.promotion = chess.QUEEN
+    session.premoves.append(move)
+    session.premove_from = None
+
+def draw_popup(session, message, buttons=None):
     if buttons is None:
         buttons = [("OK", lambda: None)]
+    popup_buttons = session.popup_buttons
     
     overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     overlay.fill((0, 0, 0, 180))
@@ -524,38 +662,38 @@ def draw_popup(message, buttons=None):
         text_rect = text.get_rect(center=rect.center)
         screen.blit(text, text_rect)
 
-def restart_game():
-    global board, selected_square, legal_moves, game_over, show_popup, timer_start, time_remaining, move_start_time, move_time_remaining, last_move, game_history, ai_thinking, show_promotion_dialog, promotion_square, LIGHT, DARK
-    
-    board = chess.Board()
-    selected_square = None
-    legal_moves = []
-    game_over = False
-    show_popup = False
-    time_remaining = TIMER_DURATION
-    move_time_remaining = MOVE_TIME_LIMIT
-    timer_start = time.time()
-    move_start_time = time.time()
-    last_move = None
-    game_history = []
-    ai_thinking = False
-    show_promotion_dialog = False
-    promotion_square = None
-    
-    theme_colors = THEMES[current_theme]
-    LIGHT = theme_colors["light"]
-    DARK = theme_colors["dark"]
-
-    update_ai_difficulty()
-    
-    if player_color == chess.BLACK and stockfish:
-        ai_thinking = True
-        ai_move = get_ai_move()
-        board.push(ai_move)
-        last_move = ai_move
-        game_history.append(ai_move.uci())
-        ai_thinking = False
-        move_start_time = time.time()
+def start_spectator(session):
+    global spectator_thread
+    # Tails this game's replay; the thread ends when the session is reset.
+    # Let the previous game's thread write its result first.
+    if spectator_thread is not None:
+        spectator_thread.join(1)
+    spectator_thread = threading.Thread(target=spectate, args=(session.replay, spectator_out), daemon=True)
+    spectator_thread.start()
+
+def restart_game(session, fen=chess.STARTING_FEN):
+    # A search still running for the old game is not waited for: reset() drops
+    # the thread, so its result is never applied
+    session.reset(fen)
+    session.start_clocks()
+    if spectator_out:
+        start_spectator(session)
+    
+    update_ai_difficulty(session)
+    
+    if session.board.turn != session.player_color and stockfish:
+        start_ai_move(session)
+
+def load_next_puzzle(session):
+    puzzles = PuzzleFile(PUZZLE_FILE)
+    if not len(puzzles):
+        print(f"No puzzles found in {PUZZLE_FILE}")
+        return
+    
+    fen, move, score = puzzles[session.puzzle_index % len(puzzles)]
+    session.puzzle_index += 1
+    session.player_color = chess.Board(fen).turn
+    restart_game(session, fen)
 
 def check_info_panel_buttons(pos):
     x, y = pos
@@ -579,13 +717,11 @@ def check_info_panel_buttons(pos):
     
     return None
 
-def check_promotion_selection(pos):
-    global show_promotion_dialog, promotion_square
-    
-    if not show_promotion_dialog or not promotion_square:
+def check_promotion_selection(session, pos):
+    if not session.show_promotion_dialog or not session.promotion_square:
         return None
     
-    file, rank = chess.square_file(promotion_square), chess.square_rank(promotion_square)
+    file, rank = chess.square_file(session.promotion_square), chess.square_rank(session.promotion_square)
     x = file * SQUARE_SIZE
     y = (7 - rank) * SQUARE_SIZE
     
@@ -597,18 +733,19 @@ def check_promotion_selection(pos):
     
     return None
 
-def show_settings():
-    global show_popup, popup_message, popup_buttons
+def close_popup(session):
+    session.show_popup = False
     
-    show_popup = True
-    popup_message = f"Game Settings\nCurrent Theme: {current_theme}\nDifficulty: {difficulty}"
+def show_settings(session):
+    session.show_popup = True
+    session.popup_message = f"Game Settings\nCurrent Theme: {session.theme}\nDifficulty: {session.difficulty}"
     
     buttons = [
-        ("OK", lambda: globals().update(show_popup=False)),
+        ("OK", lambda: close_popup(session)),
         ("Give Up", lambda: pygame.event.post(pygame.event.Event(pygame.QUIT))),
-        ("Difficulty", cycle_difficulty),
-        ("Change Theme", cycle_theme),
-        ("Cancel", lambda: globals().update(show_popup=False))
+        ("Difficulty", lambda: cycle_difficulty(session)),
+        ("Change Theme", lambda: cycle_theme(session)),
+        ("Cancel", lambda: close_popup(session))
     ]
     
     popup_buttons = []
@@ -635,42 +772,34 @@ def show_settings():
     cancel_x = (WIDTH - button_width) // 2
     cancel_y = start_y + 2 * (button_height + button_spacing)
     popup_buttons.append((pygame.Rect(cancel_x, cancel_y, button_width, button_height), buttons[4][1]))
+    session.popup_buttons = popup_buttons
 
-def check_timers():
-    global game_over, show_popup, popup_message, time_remaining, move_time_remaining
-    
-    if timer_start is None or game_over:
+def check_timers(session):
+    if session.timer_start is None or session.game_over:
         return
     
     # Game timer
-    elapsed = time.time() - timer_start
-    time_remaining = max(0, TIMER_DURATION - elapsed)
+    elapsed = time.time() - session.timer_start
+    session.time_remaining = max(0, TIMER_DURATION - elapsed)
     
     # Move timer
-    if move_start_time is not None:
-        move_elapsed = time.time() - move_start_time
-        move_time_remaining = max(0, MOVE_TIME_LIMIT - move_elapsed)
-    
-    if time_remaining <= 0 and not game_over:
-        game_over = True
-        show_popup = True
-        popup_message = "Time's up!\nYou ran out of time"
-    
-    if move_time_remaining <= 0 and not game_over and not ai_thinking:
-        game_over = True
-        show_popup = True
-        popup_message = "Move time exceeded!\nYou took too long"
-
-def save_game_state():
-    state = {
-        "fen": board.fen(),
-        "time_remaining": time_remaining,
-        "move_time_remaining": move_time_remaining,
-        "player_color": player_color,
-        "difficulty": difficulty,
-        "current_theme": current_theme,
-        "timestamp": datetime.now().isoformat()
-    }
+    if session.move_start_time is not None:
+        move_elapsed = time.time() - session.move_start_time
+        session.move_time_remaining = max(0, MOVE_TIME_LIMIT - move_elapsed)
+    
+    if session.time_remaining <= 0 and not session.game_over:
+        session.game_over = True
+        session.show_popup = True
+        session.popup_message = "Time's up!\nYou ran out of time"
+    
+    if session.move_time_remaining <= 0 and not session.game_over and not session.ai_thinking:
+        session.game_over = True
+        session.show_popup = True
+        session.popup_message = "Move time exceeded!\nYou took too long"
+
+def save_game_state(session):
+    state = session.snapshot()
+    state["timestamp"] = datetime.now().isoformat()
     
     try:
         with open("saved_game.json", "w") as f:
@@ -679,174 +808,153 @@ def save_game_state():
         print("Failed to save game state")
 
 def load_game_state():
-    global board, game_history, time_remaining, move_time_remaining, player_color, difficulty, current_theme
     try:
         with open("saved_game.json", "r") as f:
             state = json.load(f)
         
-        board = chess.Board(state["fen"])
-        time_remaining = state["time_remaining"]
-        move_time_remaining = state["move_time_remaining"]
-        player_color = state["player_color"]
-        
-        if "difficulty" in state:
-            difficulty = state["difficulty"]
-        if "current_theme" in state:
-            current_theme = state["current_theme"]
-        
-        update_ai_difficulty()
-        return True
+        session = GameSession.from_snapshot(state)
+        update_ai_difficulty(session)
+        return session
     except:
         print("No saved game found or error loading")
-        return False
+        return None
 
 # Main game 
-def main():
-    global running, selected_square, legal_moves, show_popup, game_over, popup_message, show_promotion_dialog, promotion_square, timer_start, move_start_time, ai_thinking
+def main(argv=None):
+    global spectator_out
+    parser = argparse.ArgumentParser(description="Play chess against Stockfish")
+    parser.add_argument("--spectate", metavar="PATH",
+                        help="write the moves to PATH (a file or FIFO) as they are played")
+    args = parser.parse_args(argv)
+    if args.spectate:
+        # Opening a FIFO waits here until a reader connects
+        spectator_out = open(args.spectate, "w")
+    
+    init_resources()
     
     running = True
     clock = pygame.time.Clock()
-    timer_start = time.time()
-    move_start_time = time.time()
 
-    load_game_state()
+    session = load_game_state() or GameSession()
+    session.start_clocks()
+    if spectator_out:
+        start_spectator(session)
+    
+    # Saved while the AI was thinking: its search was lost with the old process
+    if session.board.turn != session.player_color and not session.board.is_game_over():
+        start_ai_move(session)
 
     while running:
         for event in pygame.event.get():
             if event.type == QUIT:
-                save_game_state()
+                save_game_state(session)
                 running = False
             
+            elif event.type == KEYDOWN and not session.show_popup:
+                # Scrub through the game; END returns to the live position
+                plies = len(session.moves)
+                current = plies if session.review_ply is None else session.review_ply
+                if event.key == K_LEFT:
+                    session.review_ply = max(0, current - 1)
+                elif event.key == K_RIGHT:
+                    session.review_ply = min(plies, current + 1)
+                elif event.key == K_HOME:
+                    session.review_ply = 0
+                elif event.key == K_END:
+                    session.review_ply = None
+                elif event.key == K_p:
+                    load_next_puzzle(session)
+                    continue
+                if session.review_ply == plies:
+                    session.review_ply = None
+            
             elif event.type == MOUSEBUTTONDOWN:
-                if show_popup:
-                    for button_rect, callback in popup_buttons:
+                if session.show_popup:
+                    for button_rect, callback in session.popup_buttons:
                         if button_rect.collidepoint(event.pos):
                             callback()
                     continue
                 
-                if show_promotion_dialog:
-                    promoted_to = check_promotion_selection(event.pos)
+                if session.show_promotion_dialog:
+                    promoted_to = check_promotion_selection(session, event.pos)
                     if promoted_to:
-                        move = chess.Move(selected_square, promotion_square, promotion=promoted_to)
-                        if move in legal_moves:
-                            board.push(move)
-                            play_sound(move)
-                            game_history.append(move.uci())
-                            last_move = move
-                            
-                            if board.is_game_over():
-                                game_over = True
-                                if board.is_checkmate():
-                                    popup_message = "Checkmate!\nYou win!"
-                                else:
-                                    popup_message = "Game Over!\nDraw"
-                                show_popup = True
-                            else:
-                                ai_thinking = True
-                                ai_move = get_ai_move()
-                                board.push(ai_move)
-                                game_history.append(ai_move.uci())
-                                last_move = ai_move
-                                play_sound(ai_move)
-                                ai_thinking = False
-                                move_start_time = time.time()
-                                
-                                if board.is_game_over():
-                                    game_over = True
-                                    if board.is_checkmate():
-                                        popup_message = "Checkmate!\nAI wins"
-                                    else:
-                                        popup_message = "Game Over!\nDraw"
-                                    show_popup = True
+                        move = chess.Move(session.selected_square, session.promotion_square, promotion=promoted_to)
+                        if move in session.legal_moves:
+                            make_player_move(session, move)
                     
-                    show_promotion_dialog = False
-                    promotion_square = None
-                    selected_square = None
-                    legal_moves = []
+                    session.show_promotion_dialog = False
+                    session.promotion_square = None
+                    session.selected_square = None
+                    session.legal_moves = []
                     continue
                 
                 button = check_info_panel_buttons(event.pos)
                 if button == "new_game":
-                    restart_game()
+                    restart_game(session)
                     continue
                 elif button == "give_up":
-                    game_over = True
-                    show_popup = True
-                    popup_message = "You gave up!\nAI wins"
+                    session.game_over = True
+                    session.show_popup = True
+                    session.popup_message = "You gave up!\nAI wins"
                     continue
                 elif button == "settings":
-                    show_settings()
+                    show_settings(session)
+                    continue
+                
+                if session.game_over:
                     continue
                 
-                if game_over or ai_thinking:
+                if session.review_ply is not None:
+                    session.review_ply = None
                     continue
                     
                 square = square_at_pos(event.pos)
                 if square is None:
                     continue
                 
-                if selected_square:
-                    move = chess.Move(selected_square, square)
+                if session.ai_thinking:
+                    if event.button == 3:
+                        session.premoves.clear()
+                        session.premove_from = None
+                    else:
+                        queue_premove(session, square)
+                    continue
+                
+                if session.selected_square:
+                    move = chess.Move(session.selected_square, square)
                     
-                    piece = board.piece_at(selected_square)
+                    piece = session.board.piece_at(session.selected_square)
                     if piece and piece.piece_type == chess.PAWN and chess.square_rank(square) in [0, 7]:
-                        promotion_square = square
-                        show_promotion_dialog = True
+                        session.promotion_square = square
+                        session.show_promotion_dialog = True
                         continue
                     
-                    if move in legal_moves:
-                        board.push(move)
-                        play_sound(move)
-                        game_history.append(move.uci())
-                        last_move = move
-                        selected_square = None
-                        legal_moves = []
-                        move_start_time = time.time()
-                        
-                        if board.is_game_over():
-                            game_over = True
-                            if board.is_checkmate():
-                                popup_message = "Checkmate!\nYou win!"
-                            else:
-                                popup_message = "Game Over!\nDraw"
-                            show_popup = True
-                        else:
-                            ai_thinking = True
-                            ai_move = get_ai_move()
-                            board.push(ai_move)
-                            game_history.append(ai_move.uci())
-                            last_move = ai_move
-                            play_sound(ai_move)
-                            ai_thinking = False
-                            move_start_time = time.time()
-                            
-                            if board.is_game_over():
-                                game_over = True
-                                if board.is_checkmate():
-                                    popup_message = "Checkmate!\nAI wins"
-                                else:
-                                    popup_message = "Game Over!\nDraw"
-                                show_popup = True
+                    if move in session.legal_moves:
+                        session.selected_square = None
+                        session.legal_moves = []
+                        make_player_move(session, move)
                     else:
-                        selected_square = None
-                        legal_moves = []
+                        session.selected_square = None
+                        session.legal_moves = []
                 else:
-                    piece = board.piece_at(square)
-                    if piece and piece.color == player_color:
-                        selected_square = square
-                        legal_moves = [move for move in board.legal_moves if move.from_square == square]
+                    piece = session.board.piece_at(square)
+                    if piece and piece.color == session.player_color:
+                        session.selected_square = square
+                        session.legal_moves = [move for move in session.board.legal_moves if move.from_square == square]
+        
+        apply_ai_move(session)
         
         # Check timers
-        if not game_over and not show_popup and not ai_thinking:
-            check_timers()
+        if not session.game_over and not session.show_popup and not session.ai_thinking:
+            check_timers(session)
         
         screen.fill((0, 0, 0))
-        draw_board()
-        draw_info_panel()
-        draw_promotion_dialog()
+        draw_board(session)
+        draw_info_panel(session)
+        draw_promotion_dialog(session)
         
-        if show_popup:
-            draw_popup(popup_message)
+        if session.show_popup:
+            draw_popup(session, session.popup_message)
         
         pygame.display.flip()
         clock.tick(60)
@@ -0,0 +1,227 @@
+import os
+import shutil
+import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+STOCKFISH_PATHS = [
+    "stockfish.exe",
+    "stockfish",
+    "./stockfish.exe",
+    "./stockfish",
+    "C:/Program Files/Stockfish/stockfish.exe",
+    "C:/Program Files (x86)/Stockfish/stockfish.exe"
+]
+
+# Total MB all engines in this process may use; 0 means a quarter of available memory
+ENGINE_MEMORY_BUDGET_MB = int(os.environ.get("CHESS_ENGINE_MEMORY_MB", "0"))
+# Pin each engine to its own block of CPUs (Linux only)
+PIN_ENGINE_CPUS = os.environ.get("CHESS_ENGINE_PIN_CPUS", "") == "1"
+ENGINE_OVERHEAD_MB = 32  # Stockfish process and NNUE weights on top of Hash
+MIN_HASH_MB = 16
+
+DIFFICULTY_SETTINGS = {
+    "Easy": {
+        "skill_level": 5,
+        "depth": 8,
+        "random_factor": 0.3  
+    },
+    "Medium": {
+        "skill_level": 10,
+        "depth": 12,
+        "random_factor": 0.1  
+    },
+    "Hard": {
+        "skill_level": 15,
+        "depth": 16,
+        "random_factor": 0.0
+    }
+}
+
+ENGINE_PROFILES = {
+    "Easy": {
+        "core_share": 0.0,  # always a single thread
+        "hash_mb": 16
+    },
+    "Medium": {
+        "core_share": 0.5,
+        "hash_mb": 128
+    },
+    "Hard": {
+        "core_share": 1.0,
+        "hash_mb": 512
+    }
+}
+
+def find_stockfish_path():
+    for path in STOCKFISH_PATHS:
+        found = shutil.which(path) or (path if os.path.isfile(path) else None)
+        if found:
+            return found
+    return None
+
+def host_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def host_available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 1024
+
+def memory_budget_mb():
+    if ENGINE_MEMORY_BUDGET_MB > 0:
+        return ENGINE_MEMORY_BUDGET_MB
+    return max(MIN_HASH_MB + ENGINE_OVERHEAD_MB, host_available_memory_mb() // 4)
+
+def max_engines(budget_mb=None):
+    # How many engines fit in the budget at the smallest Hash
+    if budget_mb is None:
+        budget_mb = memory_budget_mb()
+    return budget_mb // (MIN_HASH_MB + ENGINE_OVERHEAD_MB)
+
+def fit_workers(workers, budget_mb=None):
+    # Largest pool up to `workers` that fits the budget; 0 when not even one engine does
+    fitting = max_engines(budget_mb)
+    if fitting < 1:
+        print("The engine memory budget is too small for a single engine.", file=sys.stderr)
+    elif workers > fitting:
+        print(f"Memory budget fits {fitting} engines; using {fitting} workers", file=sys.stderr)
+    return min(workers, fitting)
+
+def stop_engine(engine):
+    try:
+        if engine._stockfish:
+            engine._stockfish.kill()
+            engine._stockfish.wait()
+    except Exception:
+        pass
+
+def _round_down_pow2(value):
+    result = 1
+    while result * 2 <= value:
+        result *= 2
+    return result
+
+def engine_profile(difficulty, engines=1, budget_mb=None):
+    # Threads and Hash for one of `engines` engines sharing this host
+    profile = ENGINE_PROFILES[difficulty]
+    cores = len(host_cpus())
+    engines = max(1, engines)
+
+    threads = int(cores * profile["core_share"]) // engines
+    threads = max(1, min(threads, cores))
+
+    if budget_mb is None:
+        budget_mb = memory_budget_mb()
+    hash_cap = budget_mb // engines - ENGINE_OVERHEAD_MB
+    hash_mb = _round_down_pow2(max(MIN_HASH_MB, min(profile["hash_mb"], hash_cap)))
+
+    return {"Threads": threads, "Hash": hash_mb}
+
+def engine_cpus(index, threads):
+    # Block of CPUs for the index-th engine, wrapping when engines outnumber cores
+    cpus = host_cpus()
+    start = (index * threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(min(threads, len(cpus)))]
+
+def pin_engine(pid, cpus):
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(pid, cpus)
+        return True
+    except OSError as e:
+        print(f"Could not pin engine {pid} to CPUs {cpus}: {e}")
+        return False
+
+def pin_pool_worker(counter, threads):
+    # Pool initializer side: claim the next worker index from the shared counter and,
+    # when pinning is on, pin this process; the engine it starts inherits the CPU mask
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    if PIN_ENGINE_CPUS:
+        pin_engine(os.getpid(), engine_cpus(index, threads))
+    return index
+
+class EngineAdmission:
+    def __init__(self, budget_mb=None):
+        self.budget_mb = budget_mb or memory_budget_mb()
+        self.reserved = {}
+        self._condition = threading.Condition()
+
+    def in_use_mb(self):
+        return sum(self.reserved.values())
+
+    def admit(self, owner, hash_mb, timeout=None):
+        # Reserve memory for an engine; the Hash is shrunk to fit the budget, and
+        # when not even MIN_HASH_MB fits we wait for a release. Returns the Hash
+        # granted, or None on timeout or when the budget can never fit an engine.
+        with self._condition:
+            self.reserved.pop(owner, None)
+            if max_engines(self.budget_mb) < 1:
+                return None
+            while True:
+                free = self.budget_mb - self.in_use_mb() - ENGINE_OVERHEAD_MB
+                if free >= MIN_HASH_MB:
+                    granted = _round_down_pow2(max(MIN_HASH_MB, min(hash_mb, free)))
+                    self.reserved[owner] = granted + ENGINE_OVERHEAD_MB
+                    return granted
+                if not self._condition.wait(timeout):
+                    return None
+
+    def release(self, owner):
+        with self._condition:
+            self.reserved.pop(owner, None)
+            self._condition.notify_all()
+
+def configure_engine(stockfish, difficulty, admission, owner=None, engines=1, index=0, timeout=None):
+    # Apply the host-aware profile to a python-stockfish engine
+    profile = engine_profile(difficulty, engines, admission.budget_mb)
+    owner = owner if owner is not None else id(stockfish)
+    granted = admission.admit(owner, profile["Hash"], timeout)
+    if granted is None:
+        return None
+    profile["Hash"] = granted
+    stockfish.update_engine_parameters(profile)
+
+    process = getattr(stockfish, "_stockfish", None)
+    if PIN_ENGINE_CPUS and process is not None:
+        pin_engine(process.pid, engine_cpus(index, profile["Threads"]))
+    return profile
+
+def pool_map(executor, fn, items, window, ordered=True):
+    # Like executor.map, but only `window` tasks are in flight so huge inputs
+    # stream through in constant memory. Yields results in input order, or in
+    # completion order when ordered is False.
+    pending = deque()
+    items = iter(items)
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending.append(executor.submit(fn, item))
+        if not pending:
+            return
+        if ordered:
+            yield pending.popleft().result()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
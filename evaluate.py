@@ -0,0 +1,138 @@
+import chess
+import numpy as np
+
+PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING]
+PIECE_VALUES = np.array([100, 320, 330, 500, 900, 0], dtype=np.float32)
+MOBILITY_WEIGHT = 2.0  # cp per reachable square; empty-board attacks overcount sliders
+
+# Piece-square tables from White's side, written with rank 8 on top
+_PST_RANK8_FIRST = [
+    [  # pawn
+         0,  0,  0,  0,  0,  0,  0,  0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+         5,  5, 10, 25, 25, 10,  5,  5,
+         0,  0,  0, 20, 20,  0,  0,  0,
+         5, -5,-10,  0,  0,-10, -5,  5,
+         5, 10, 10,-20,-20, 10, 10,  5,
+         0,  0,  0,  0,  0,  0,  0,  0
+    ],
+    [  # knight
+        -50,-40,-30,-30,-30,-30,-40,-50,
+        -40,-20,  0,  0,  0,  0,-20,-40,
+        -30,  0, 10, 15, 15, 10,  0,-30,
+        -30,  5, 15, 20, 20, 15,  5,-30,
+        -30,  0, 15, 20, 20, 15,  0,-30,
+        -30,  5, 10, 15, 15, 10,  5,-30,
+        -40,-20,  0,  5,  5,  0,-20,-40,
+        -50,-40,-30,-30,-30,-30,-40,-50
+    ],
+    [  # bishop
+        -20,-10,-10,-10,-10,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5, 10, 10,  5,  0,-10,
+        -10,  5,  5, 10, 10,  5,  5,-10,
+        -10,  0, 10, 10, 10, 10,  0,-10,
+        -10, 10, 10, 10, 10, 10, 10,-10,
+        -10,  5,  0,  0,  0,  0,  5,-10,
+        -20,-10,-10,-10,-10,-10,-10,-20
+    ],
+    [  # rook
+         0,  0,  0,  0,  0,  0,  0,  0,
+         5, 10, 10, 10, 10, 10, 10,  5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+         0,  0,  0,  5,  5,  0,  0,  0
+    ],
+    [  # queen
+        -20,-10,-10, -5, -5,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5,  5,  5,  5,  0,-10,
+         -5,  0,  5,  5,  5,  5,  0, -5,
+          0,  0,  5,  5,  5,  5,  0, -5,
+        -10,  5,  5,  5,  5,  5,  0,-10,
+        -10,  0,  5,  0,  0,  0,  0,-10,
+        -20,-10,-10, -5, -5,-10,-10,-20
+    ],
+    [  # king (middlegame)
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -20,-30,-30,-40,-40,-30,-30,-20,
+        -10,-20,-20,-20,-20,-20,-20,-10,
+         20, 20,  0,  0,  0,  0, 20, 20,
+         20, 30, 10,  0,  0, 10, 30, 20
+    ]
+]
+
+# Indexed [piece, square] with a1 = 0, material folded in
+PIECE_SQUARE = (np.array(_PST_RANK8_FIRST, dtype=np.float32).reshape(6, 8, 8)[:, ::-1, :].reshape(6, 64)
+                + PIECE_VALUES[:, None])
+
+def _empty_board_attacks():
+    attacks = np.zeros((6, 64, 64), dtype=np.float32)
+    for square in chess.SQUARES:
+        diagonal = chess.BB_DIAG_ATTACKS[square][0]
+        straight = chess.BB_FILE_ATTACKS[square][0] | chess.BB_RANK_ATTACKS[square][0]
+        masks = [
+            chess.BB_PAWN_ATTACKS[chess.WHITE][square],
+            chess.BB_KNIGHT_ATTACKS[square],
+            diagonal,
+            straight,
+            diagonal | straight,
+            chess.BB_KING_ATTACKS[square]
+        ]
+        for piece, mask in enumerate(masks):
+            for target in chess.scan_forward(mask):
+                attacks[piece, square, target] = 1
+    return attacks.reshape(6 * 64, 64)
+
+# [piece * 64 + square, target]: squares a White piece would attack on an empty board
+ATTACKS = _empty_board_attacks()
+
+def boards_to_planes(boards):
+    # (N, 12, 64) uint8 bitplanes: White pawn..king, then Black pawn..king
+    masks = np.array([[board.pieces_mask(piece, color) for color in (chess.WHITE, chess.BLACK) for piece in PIECE_TYPES]
+                      for board in boards], dtype="<u8")
+    bits = np.unpackbits(masks.view(np.uint8), axis=-1, bitorder="little")
+    return bits.reshape(len(boards), 12, 64)
+
+def evaluate_planes(planes):
+    count = planes.shape[0]
+    white = planes[:, :6].astype(np.float32)
+    # Mirror Black's pieces so both sides use the same tables and attack masks
+    black = planes[:, 6:].reshape(count, 6, 8, 8)[:, :, ::-1, :].reshape(count, 6, 64).astype(np.float32)
+
+    score = np.einsum("npk,pk->n", white, PIECE_SQUARE) - np.einsum("npk,pk->n", black, PIECE_SQUARE)
+
+    mobility = []
+    for side in (white, black):
+        attacked = side.reshape(count, 6 * 64) @ ATTACKS > 0
+        occupied = side.sum(axis=1) > 0
+        mobility.append((attacked & ~occupied).sum(axis=1))
+    score += MOBILITY_WEIGHT * (mobility[0] - mobility[1])
+
+    return np.rint(score).astype(np.int32)
+
+def evaluate_boards(boards):
+    # Static scores in centipawns from White's point of view
+    if not boards:
+        return np.zeros(0, dtype=np.int32)
+    return evaluate_planes(boards_to_planes(boards))
+
+def order_moves(board, moves=None):
+    # Moves sorted best first for the side to move, by the static score after each
+    moves = list(board.legal_moves) if moves is None else list(moves)
+    children = []
+    for move in moves:
+        child = board.copy(stack=False)
+        child.push(move)
+        children.append(child)
+    scores = evaluate_boards(children)
+    if board.turn == chess.BLACK:
+        scores = -scores
+    return [moves[i] for i in np.argsort(-scores, kind="stable")]
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Value
+
+import chess
+import chess.pgn
+from stockfish import Stockfish
+
+from engine import (DIFFICULTY_SETTINGS, engine_profile, find_stockfish_path, fit_workers, pin_pool_worker,
+                    pool_map, stop_engine)
+
+PUZZLE_FILE = "puzzles.dat"
+MIN_PLY = 10           # skip the opening
+WIN_CP = 200           # best move must be at least this good for the side to move
+SECOND_MAX_CP = 50     # and the second best no better than this
+PROGRESS_INTERVAL = 5  # seconds between progress lines
+CHECKPOINT_GAMES = 50
+PREFILTER_BATCH = 512  # positions scored per vectorized static-eval pass
+
+_INDEX = struct.Struct("<Q")
+
+# Stage 1: stored games, one at a time
+
+def read_games(paths):
+    # PGN files, or JSONL with {"moves": [uci, ...], "fen": optional start}.
+    # A record that cannot be read yields (None, reason) so game numbering stays stable.
+    for path in paths:
+        with open(path) as f:
+            if path.endswith(".pgn"):
+                while True:
+                    game = chess.pgn.read_game(f)
+                    if game is None:
+                        break
+                    if game.errors:
+                        yield None, f"{path}: {game.errors[0]}"
+                        continue
+                    yield game.board().fen(), [move.uci() for move in game.mainline_moves()]
+            else:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        yield record.get("fen", chess.STARTING_FEN), record["moves"]
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        yield None, f"{path}:{line_number}: {type(e).__name__}: {e}"
+
+# Stage 2: candidate positions
+
+def iter_positions(games, skip_games=0):
+    for game_index, (fen, moves) in enumerate(games):
+        if game_index < skip_games:
+            continue
+        try:
+            if fen is None:
+                raise ValueError(moves)
+            board = chess.Board(fen)
+            for ply, uci in enumerate(moves):
+                if ply >= MIN_PLY and not board.is_check() and board.legal_moves.count() > 1:
+                    yield game_index, board.fen()
+                board.push_uci(uci)
+        except ValueError as e:
+            # Positions before a bad move are still real ones; the rest of the game is dropped
+            print(f"Skipping game {game_index}: {e}", file=sys.stderr)
+        # End-of-game marker so the writer knows this game is fully analysed
+        yield game_index, None
+
+def prefilter_positions(positions, max_cp, batch=PREFILTER_BATCH):
+    # Drop positions whose static eval is already lopsided before they reach
+    # the engine pool; end-of-game markers pass through in order.
+    import evaluate
+
+    def flush(pending):
+        boards = [chess.Board(fen) for _, fen in pending if fen is not None]
+        scores = iter(abs(evaluate.evaluate_boards(boards)))
+        for game_index, fen in pending:
+            if fen is None or next(scores) <= max_cp:
+                yield game_index, fen
+
+    pending = []
+    for position in positions:
+        pending.append(position)
+        if len(pending) >= batch:
+            yield from flush(pending)
+            pending = []
+    yield from flush(pending)
+
+# Stage 3: engine pool
+
+worker_engine = None
+worker_args = None
+
+def init_worker(path, depth, profile, counter):
+    pin_pool_worker(counter, profile["Threads"])
+    start_worker_engine(path, depth, profile)
+
+def start_worker_engine(path, depth, profile):
+    global worker_engine, worker_args
+    worker_engine = Stockfish(path=path, depth=depth, parameters=profile)
+    worker_args = (path, depth, profile)
+
+def restart_worker():
+    stop_engine(worker_engine)
+    start_worker_engine(*worker_args)
+
+def classify(task):
+    game_index, fen = task
+    if fen is None:
+        return game_index, True, None
+    try:
+        worker_engine.set_fen_position(fen)
+        top = worker_engine.get_top_moves(2)
+    except Exception as e:
+        # Lose this position, not the run; the next task gets a fresh engine
+        print(f"Engine error on {fen}: {e}", file=sys.stderr)
+        restart_worker()
+        return game_index, False, None
+    if len(top) < 2:
+        return game_index, False, None
+
+    best, second = top
+    # Scores are from the side to move; a mate for us counts as winning
+    def score(line):
+        if line["Mate"] is not None:
+            return 100000 if line["Mate"] > 0 else -100000
+        return line["Centipawn"]
+
+    if score(best) >= WIN_CP and score(second) <= SECOND_MAX_CP:
+        return game_index, False, (fen, best["Move"], score(best))
+    return game_index, False, None
+
+# Stage 4: compact indexed output
+
+class PuzzleFile:
+    # Records are "fen;move;score" lines in `path`; `path`.idx holds one
+    # little-endian uint64 offset per record, so any puzzle is two seeks away.
+    def __init__(self, path=PUZZLE_FILE):
+        self.path = path
+        self.index_path = path + ".idx"
+
+    def __len__(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // _INDEX.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        with open(self.index_path, "rb") as f:
+            f.seek(i * _INDEX.size)
+            offset, = _INDEX.unpack(f.read(_INDEX.size))
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            fen, move, score = f.readline().decode().rstrip("\n").split(";")
+        return fen, move, int(score)
+
+def open_truncated(path, size):
+    # Reopen an interrupted run's output, dropping anything written after its last checkpoint
+    f = open(path, "r+b" if os.path.exists(path) else "w+b")
+    f.truncate(size)
+    f.seek(size)
+    return f
+
+def input_signature(paths):
+    # Identifies the game collection a checkpoint belongs to
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"inputs": None, "games_done": 0, "data_size": 0, "puzzles": 0}
+
+def write_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def save_progress(path, state, games_done, data, index):
+    data.flush()
+    index.flush()
+    state["games_done"] = games_done
+    state["data_size"] = data.tell()
+    write_checkpoint(path, state)
+
+def mine(paths, out=PUZZLE_FILE, workers=None, difficulty="Hard", depth=None, max_static=None):
+    engine_path = find_stockfish_path()
+    if engine_path is None:
+        print("Stockfish not found in any common locations.")
+        return 1
+
+    workers = workers or os.cpu_count() or 1
+    workers = fit_workers(workers)
+    if not workers:
+        return 1
+    depth = depth or DIFFICULTY_SETTINGS[difficulty]["depth"]
+    profile = engine_profile(difficulty, engines=workers)
+    checkpoint_path = out + ".ckpt"
+    state = read_checkpoint(checkpoint_path)
+    inputs = input_signature(paths)
+    if state["inputs"] is None:
+        state["inputs"] = inputs
+    elif state["inputs"] != inputs:
+        # Resuming would skip the first games_done games of a different collection
+        print(f"{checkpoint_path} belongs to a run over other (or changed) game files.")
+        print(f"Use another --out, or delete {checkpoint_path} to start over into {out}.")
+        return 1
+    if state["games_done"]:
+        print(f"Resuming after {state['games_done']} games, {state['puzzles']} puzzles")
+
+    # Drop anything written after the last checkpoint
+    data = open_truncated(out, state["data_size"])
+    index = open_truncated(PuzzleFile(out).index_path, state["puzzles"] * _INDEX.size)
+
+    positions = iter_positions(read_games(paths), state["games_done"])
+    if max_static is not None:
+        positions = prefilter_positions(positions, max_static)
+    analysed = 0
+    completed = state["games_done"]
+    started = last_report = time.time()
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(engine_path, depth, profile, Value("i", 0))) as executor:
+        for game_index, game_done, puzzle in pool_map(executor, classify, positions, workers * 4):
+            if puzzle is not None:
+                fen, move, score = puzzle
+                index.write(_INDEX.pack(data.tell()))
+                data.write(f"{fen};{move};{score}\n".encode())
+                state["puzzles"] += 1
+            if not game_done:
+                analysed += 1
+            else:
+                completed = game_index + 1
+                if completed - state["games_done"] >= CHECKPOINT_GAMES:
+                    save_progress(checkpoint_path, state, completed, data, index)
+
+            now = time.time()
+            if now - last_report >= PROGRESS_INTERVAL:
+                rate = analysed / (now - started)
+                print(f"games {completed}  positions {analysed}  puzzles {state['puzzles']}  {rate:.1f} pos/s")
+                last_report = now
+
+    save_progress(checkpoint_path, state, completed, data, index)
+
+    data.close()
+    index.close()
+    print(f"Done: {state['puzzles']} puzzles in {out} ({time.time() - started:.1f}s)")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mine tactics puzzles from stored games")
+    parser.add_argument("games", nargs="+", help="PGN files or JSONL files of move lists")
+    parser.add_argument("-o", "--out", default=PUZZLE_FILE)
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("-d", "--difficulty", default="Hard", choices=list(DIFFICULTY_SETTINGS))
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--max-static-eval", type=int, metavar="CP",
+                        help="skip positions whose static eval is beyond +/-CP (needs NumPy)")
+    args = parser.parse_args(argv)
+    return mine(args.games, args.out, args.workers, args.difficulty, args.depth, args.max_static_eval)
+
+if __name__ == "__main__":
+    sys.exit(main())
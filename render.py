@@ -0,0 +1,173 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+if __name__ == "__main__":
+    # Batch rendering never plays sound; set before chess_gui's import initialises the mixer,
+    # and inherited by the worker processes
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import chess
+import pygame
+
+from chess_gui import THEMES, LAST_MOVE, CHECK_RED, load_images
+from engine import pool_map
+from puzzles import read_games
+
+THUMBNAIL_SQUARE = 32
+FRAME_MS = 600
+
+_backgrounds = {}
+_pieces = {}
+
+def use_headless_display():
+    # Switch to the SDL dummy driver; Surface.convert() still needs a display mode
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.display.quit()
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+def _ensure_display():
+    # Reuse the window when there is one (e.g. simul.py), otherwise render headless
+    if not pygame.display.get_init() or pygame.display.get_surface() is None:
+        use_headless_display()
+
+def board_background(theme, square_size):
+    key = (theme, square_size)
+    if key not in _backgrounds:
+        _ensure_display()
+        theme_colors = THEMES[theme]
+        surface = pygame.Surface((square_size * 8, square_size * 8)).convert()
+        for rank in range(8):
+            for file in range(8):
+                color = theme_colors["light"] if (rank + file) % 2 == 0 else theme_colors["dark"]
+                pygame.draw.rect(surface, color, (file * square_size, rank * square_size, square_size, square_size))
+        _backgrounds[key] = surface
+    return _backgrounds[key]
+
+def piece_images(square_size):
+    if square_size not in _pieces:
+        _ensure_display()
+        if not pygame.font.get_init():
+            pygame.font.init()
+        _pieces[square_size] = {key: image.convert_alpha() for key, image in load_images(square_size).items()}
+    return _pieces[square_size]
+
+class BoardRenderer:
+    # Draws positions the way draw_board() does, from cached per-theme surfaces
+    def __init__(self, theme="Classic", square_size=THUMBNAIL_SQUARE):
+        self.square_size = square_size
+        self.background = board_background(theme, square_size)
+        self.pieces = piece_images(square_size)
+        self.last_move_overlay = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        self.last_move_overlay.fill(LAST_MOVE)
+        self.check_overlay = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        self.check_overlay.fill(CHECK_RED)
+
+    def square_pos(self, square):
+        return chess.square_file(square) * self.square_size, (7 - chess.square_rank(square)) * self.square_size
+
+    def render(self, board, last_move=None):
+        frame = self.background.copy()
+
+        if last_move:
+            for square in [last_move.from_square, last_move.to_square]:
+                frame.blit(self.last_move_overlay, self.square_pos(square))
+
+        if board.is_check():
+            frame.blit(self.check_overlay, self.square_pos(board.king(board.turn)))
+
+        for square, piece in board.piece_map().items():
+            key = ("w" if piece.color == chess.WHITE else "b") + piece.symbol().lower()
+            frame.blit(self.pieces[key], self.square_pos(square))
+        return frame
+
+    def render_png(self, board, path, last_move=None):
+        pygame.image.save(self.render(board, last_move), path)
+
+    def game_frames(self, moves, start_fen=chess.STARTING_FEN):
+        board = chess.Board(start_fen)
+        yield self.render(board)
+        for uci in moves:
+            move = board.push_uci(uci)
+            yield self.render(board, move)
+
+    def render_animation(self, moves, path, start_fen=chess.STARTING_FEN, frame_ms=FRAME_MS):
+        # GIF for .gif paths, APNG otherwise
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError("Animated exports need Pillow: pip install pillow")
+
+        size = (self.square_size * 8, self.square_size * 8)
+        frames = [Image.frombytes("RGB", size, pygame.image.tobytes(frame, "RGB"))
+                  for frame in self.game_frames(moves, start_fen)]
+        image_format = "GIF" if path.lower().endswith(".gif") else "PNG"
+        frames[0].save(path, format=image_format, save_all=True, append_images=frames[1:],
+                       duration=frame_ms, loop=0)
+
+worker_renderer = None
+
+def init_worker(theme, square_size):
+    global worker_renderer
+    worker_renderer = BoardRenderer(theme, square_size)
+
+def render_job(job):
+    # Returns (index, error); one malformed game must not end the batch
+    index, fen, moves, path, animate = job
+    if fen is None:
+        # read_games could not parse this record; `moves` holds the reason
+        return index, moves
+    try:
+        if animate:
+            worker_renderer.render_animation(moves, path, fen)
+        else:
+            board = chess.Board(fen)
+            last_move = None
+            for uci in moves:
+                last_move = board.push_uci(uci)
+            worker_renderer.render_png(board, path, last_move)
+    except RuntimeError:
+        # Pillow is missing; every other job would fail the same way
+        raise
+    except Exception as e:
+        return index, f"{type(e).__name__}: {e}"
+    return index, None
+
+def render_batch(paths, out_dir, theme="Classic", square_size=THUMBNAIL_SQUARE, animate=None, workers=None):
+    # animate is None for final-position thumbnails, or "gif" / "apng"
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    extension = "gif" if animate == "gif" else "png"
+    jobs = ((index, fen, moves, os.path.join(out_dir, f"game_{index:06d}.{extension}"), animate)
+            for index, (fen, moves) in enumerate(read_games(paths)))
+
+    rendered = failed = 0
+    started = time.time()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(theme, square_size)) as executor:
+        for index, error in pool_map(executor, render_job, jobs, workers * 4, ordered=False):
+            if error is None:
+                rendered += 1
+            else:
+                failed += 1
+                print(f"Skipped game {index}: {error}", file=sys.stderr)
+    print(f"Rendered {rendered} games to {out_dir}, {failed} skipped ({time.time() - started:.1f}s)")
+    return rendered
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render stored games to PNG thumbnails or animations")
+    parser.add_argument("games", nargs="+", help="PGN files or JSONL files of move lists")
+    parser.add_argument("-o", "--out-dir", default="thumbnails")
+    parser.add_argument("-t", "--theme", default="Classic", choices=list(THEMES))
+    parser.add_argument("-s", "--square-size", type=int, default=THUMBNAIL_SQUARE)
+    parser.add_argument("-a", "--animate", nargs="?", const="gif", choices=["gif", "apng"],
+                        help="write an animation of each game instead of a final-position thumbnail")
+    parser.add_argument("-w", "--workers", type=int)
+    args = parser.parse_args(argv)
+    render_batch(args.games, args.out_dir, args.theme, args.square_size, args.animate, args.workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import threading
+import chess
+
+KEYFRAME_INTERVAL = 16  # plies between FEN snapshots
+
+
+class GameReplay:
+    def __init__(self, start_fen=chess.STARTING_FEN, keyframe_interval=KEYFRAME_INTERVAL):
+        self.start_fen = start_fen
+        self.keyframe_interval = keyframe_interval
+        self.moves = []
+        # keyframes[k] is the FEN after k * keyframe_interval plies
+        self.keyframes = [start_fen]
+        self.closed = False
+        self._tip = chess.Board(start_fen)
+        self._cursor_ply = 0
+        self._cursor_board = chess.Board(start_fen)
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.moves)
+
+    def push(self, move):
+        with self._condition:
+            self._tip.push(move)
+            self.moves.append(move)
+            if len(self.moves) % self.keyframe_interval == 0:
+                self.keyframes.append(self._tip.fen())
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def move_at(self, ply):
+        # Move that produced the position at `ply`
+        if ply <= 0 or ply > len(self.moves):
+            return None
+        return self.moves[ply - 1]
+
+    def board_at(self, ply):
+        with self._condition:
+            ply = max(0, min(ply, len(self.moves)))
+            keyframe = ply // self.keyframe_interval
+            base = keyframe * self.keyframe_interval
+
+            # Step from the cursor when it sits in the same keyframe segment,
+            # so scrubbing one ply at a time is a single push or pop.
+            cursor = self._cursor_board
+            if self._cursor_ply // self.keyframe_interval != keyframe:
+                cursor = chess.Board(self.keyframes[keyframe])
+                self._cursor_ply = base
+
+            while self._cursor_ply > ply:
+                cursor.pop()
+                self._cursor_ply -= 1
+            while self._cursor_ply < ply:
+                cursor.push(self.moves[self._cursor_ply])
+                self._cursor_ply += 1
+
+            self._cursor_board = cursor
+            return cursor.copy(stack=False)
+
+    def follow(self, start=0, timeout=None):
+        # Tail the move stream: yields (ply, move) as moves land until close()
+        ply = start
+        while True:
+            with self._condition:
+                while ply >= len(self.moves) and not self.closed:
+                    if not self._condition.wait(timeout):
+                        return
+                if ply >= len(self.moves):
+                    return
+                pending = self.moves[ply:]
+            for move in pending:
+                ply += 1
+                yield ply, move
+
+def spectate(replay, out, start=0, timeout=None):
+    # Write the game to `out` as it is played, one SAN move per line, then the
+    # result once the replay is closed (game restarted or the tail times out)
+    board = replay.board_at(start)
+    for ply, move in replay.follow(start, timeout):
+        number = f"{board.fullmove_number}." if board.turn == chess.WHITE else f"{board.fullmove_number}..."
+        out.write(f"{number} {board.san(move)}\n")
+        out.flush()
+        board.push(move)
+    out.write(f"{board.result()}\n")
+    out.flush()
@@ -0,0 +1,151 @@
+import time
+from array import array
+
+import chess
+
+from replay import GameReplay
+
+TIMER_DURATION = 10 * 60  # 10 minutes in seconds
+MOVE_TIME_LIMIT = 30
+
+def encode_move(move):
+    # from (6 bits) | to (6 bits) | promotion piece type (3 bits)
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+def decode_move(code):
+    return chess.Move(code & 63, (code >> 6) & 63, promotion=(code >> 12) or None)
+
+class GameSession:
+    __slots__ = (
+        # game
+        "start_fen", "board", "moves", "_replay", "generation",
+        # clocks
+        "timer_start", "time_remaining", "move_start_time", "move_time_remaining",
+        # settings
+        "player_color", "difficulty", "theme",
+        # play state
+        "game_over", "last_move", "ai_thinking", "ai_thread", "premoves", "premove_from",
+        "selected_square", "legal_moves", "show_promotion_dialog", "promotion_square",
+        "review_ply", "show_popup", "popup_message", "popup_buttons", "puzzle_index"
+    )
+
+    def __init__(self, fen=chess.STARTING_FEN, player_color=chess.WHITE, difficulty="Medium", theme="Classic"):
+        self.player_color = player_color
+        self.difficulty = difficulty
+        self.theme = theme
+        self.puzzle_index = 0
+        self._replay = None
+        self.generation = 0
+        self.reset(fen)
+
+    def reset(self, fen=chess.STARTING_FEN):
+        if self._replay is not None:
+            self._replay.close()
+        # Bumped per game so results computed for an earlier one can be told apart
+        self.generation += 1
+        self.start_fen = fen
+        self.board = chess.Board(fen)
+        self.moves = array("H")
+        self._replay = None
+
+        self.timer_start = None
+        self.time_remaining = TIMER_DURATION
+        self.move_start_time = None
+        self.move_time_remaining = MOVE_TIME_LIMIT
+
+        self.game_over = False
+        self.last_move = None
+        self._clear_play_state()
+
+    def _clear_play_state(self):
+        self.ai_thinking = False
+        self.ai_thread = None
+        self.premoves = []
+        self.premove_from = None
+        self.selected_square = None
+        self.legal_moves = []
+        self.show_promotion_dialog = False
+        self.promotion_square = None
+        self.review_ply = None
+        self.show_popup = False
+        self.popup_message = ""
+        self.popup_buttons = []
+
+    def start_clocks(self):
+        self.timer_start = time.time()
+        self.move_start_time = time.time()
+
+    def push(self, move):
+        self.board.push(move)
+        self.moves.append(encode_move(move))
+        self.last_move = move
+        if self._replay is not None:
+            self._replay.push(move)
+
+    @property
+    def replay(self):
+        # Built on first use (reviewing or spectating) so idle sessions stay small
+        if self._replay is None:
+            self._replay = GameReplay(self.start_fen)
+            for code in self.moves:
+                self._replay.push(decode_move(code))
+        return self._replay
+
+    def history(self, last=None):
+        codes = self.moves if last is None else self.moves[-last:]
+        return [decode_move(code).uci() for code in codes]
+
+    def snapshot(self):
+        return {
+            "fen": self.board.fen(),
+            "start_fen": self.start_fen,
+            "moves": self.history(),
+            "time_remaining": self.time_remaining,
+            "move_time_remaining": self.move_time_remaining,
+            "player_color": self.player_color,
+            "difficulty": self.difficulty,
+            "current_theme": self.theme
+        }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        session = cls(player_color=state["player_color"])
+        if "difficulty" in state:
+            session.difficulty = state["difficulty"]
+        if "current_theme" in state:
+            session.theme = state["current_theme"]
+
+        # Older saves only have the current position
+        if "moves" in state and "start_fen" in state:
+            session.reset(state["start_fen"])
+            for uci in state["moves"]:
+                session.push(chess.Move.from_uci(uci))
+            session.last_move = None
+        else:
+            session.reset(state["fen"])
+
+        session.time_remaining = state["time_remaining"]
+        session.move_time_remaining = state["move_time_remaining"]
+        return session
+
+    def clone(self, stack=True):
+        # Game, clocks and settings only; the copy starts with no search or UI state.
+        # stack=False skips copying the board's move stack when only the position matters.
+        other = GameSession.__new__(GameSession)
+        other.player_color = self.player_color
+        other.difficulty = self.difficulty
+        other.theme = self.theme
+        other.puzzle_index = self.puzzle_index
+        other.start_fen = self.start_fen
+        other.board = self.board.copy(stack=stack)
+        other.moves = array("H", self.moves)
+        other._replay = None
+        other.generation = self.generation
+        other.timer_start = self.timer_start
+        other.time_remaining = self.time_remaining
+        other.move_start_time = self.move_start_time
+        other.move_time_remaining = self.move_time_remaining
+        other.game_over = self.game_over
+        other.last_move = self.last_move
+        other._clear_play_state()
+        return other
@@ -0,0 +1,233 @@
+import argparse
+import math
+import queue
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import pygame
+from pygame.locals import *
+from stockfish import Stockfish
+
+from chess_gui import THEMES, HIGHLIGHT, PANEL_COLOR, get_ai_move
+from engine import (DIFFICULTY_SETTINGS, EngineAdmission, configure_engine, find_stockfish_path, host_cpus,
+                    max_engines, stop_engine)
+from render import BoardRenderer
+from session import GameSession
+
+BOARD_MARGIN = 6
+IDLE_BORDER = (80, 80, 80)
+YOUR_MOVE_BORDER = (100, 200, 100)
+THINKING_BORDER = (230, 150, 60)
+FINISHED_BORDER = (150, 50, 50)
+FPS = 60
+
+class SimulBoard:
+    __slots__ = ("index", "session", "rect", "search", "dirty")
+
+    def __init__(self, index, session, rect):
+        self.index = index
+        self.session = session
+        self.rect = rect
+        self.search = None
+        self.dirty = True
+
+    def square_at(self, pos, square_size):
+        x = pos[0] - self.rect.x - BOARD_MARGIN
+        y = pos[1] - self.rect.y - BOARD_MARGIN
+        if not (0 <= x < square_size * 8 and 0 <= y < square_size * 8):
+            return None
+        return chess.square(x // square_size, 7 - y // square_size)
+
+class EnginePool:
+    # A few Stockfish processes shared by all boards; a board's search borrows
+    # whichever engine is free, so slow boards never block input on the others.
+    def __init__(self, size, difficulty):
+        self.difficulty = difficulty
+        self.engines = queue.Queue()
+        self.processes = []
+        self.admission = EngineAdmission()
+
+        path = find_stockfish_path()
+        if path is None:
+            print("Stockfish not found in any common locations.")
+            print("You can still play, but moves will be random.")
+            size = 1
+        else:
+            size = max(1, min(size, max_engines(self.admission.budget_mb)))
+        for index in range(size):
+            engine = None
+            if path is not None:
+                engine = Stockfish(path=path)
+                # Nothing releases memory while the pool is being built, so never wait
+                profile = configure_engine(engine, difficulty, self.admission, owner=index,
+                                           engines=size, index=index, timeout=0)
+                if profile is None and self.processes:
+                    print(f"Memory budget is full; sharing {len(self.processes)} engines")
+                    stop_engine(engine)
+                    break
+                settings = DIFFICULTY_SETTINGS[difficulty]
+                engine.set_skill_level(settings["skill_level"])
+                engine.set_depth(settings["depth"])
+                self.processes.append(engine)
+            self.engines.put(engine)
+
+        self.executor = ThreadPoolExecutor(self.engines.qsize())
+
+    def search(self, board):
+        position = board.copy(stack=False)
+
+        def run():
+            engine = self.engines.get()
+            try:
+                return get_ai_move(position, self.difficulty, engine)
+            finally:
+                self.engines.put(engine)
+
+        return self.executor.submit(run)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for engine in self.processes:
+            stop_engine(engine)
+
+def layout(count, width, height):
+    cols = math.ceil(math.sqrt(count * width / height))
+    rows = math.ceil(count / cols)
+    cell = min(width // cols, height // rows)
+    square_size = (cell - 2 * BOARD_MARGIN) // 8
+    rects = [pygame.Rect((i % cols) * cell, (i // cols) * cell, cell, cell) for i in range(count)]
+    return rects, square_size
+
+def border_color(simul_board):
+    session = simul_board.session
+    if session.game_over:
+        return FINISHED_BORDER
+    if session.ai_thinking:
+        return THINKING_BORDER
+    if session.selected_square is not None:
+        return YOUR_MOVE_BORDER
+    return IDLE_BORDER
+
+def draw_simul_board(screen, renderer, overlays, simul_board):
+    session = simul_board.session
+    frame = renderer.render(session.board, session.last_move)
+
+    if session.selected_square is not None:
+        frame.blit(overlays["selected"], renderer.square_pos(session.selected_square))
+        for move in session.legal_moves:
+            frame.blit(overlays["target"], renderer.square_pos(move.to_square))
+
+    pygame.draw.rect(screen, border_color(simul_board), simul_board.rect)
+    screen.blit(frame, (simul_board.rect.x + BOARD_MARGIN, simul_board.rect.y + BOARD_MARGIN))
+    simul_board.dirty = False
+    return simul_board.rect
+
+def finish_move(simul_board):
+    session = simul_board.session
+    if session.board.is_game_over():
+        session.game_over = True
+        print(f"Board {simul_board.index + 1} finished: {session.board.result()}")
+
+def handle_click(simul_board, square, pool):
+    session = simul_board.session
+    if session.game_over or session.ai_thinking or square is None:
+        return
+    simul_board.dirty = True
+
+    if session.selected_square is not None:
+        move = chess.Move(session.selected_square, square)
+        piece = session.board.piece_at(session.selected_square)
+        if piece.piece_type == chess.PAWN and chess.square_rank(square) in [0, 7]:
+            move.promotion = chess.QUEEN
+        session.selected_square = None
+        session.legal_moves = []
+        if move in session.board.legal_moves:
+            session.push(move)
+            finish_move(simul_board)
+            if not session.game_over:
+                session.ai_thinking = True
+                simul_board.search = pool.search(session.board)
+            return
+
+    piece = session.board.piece_at(square)
+    if piece and piece.color == session.player_color:
+        session.selected_square = square
+        session.legal_moves = [move for move in session.board.legal_moves if move.from_square == square]
+
+def apply_searches(boards):
+    for simul_board in boards:
+        search = simul_board.search
+        if search is None or not search.done():
+            continue
+        session = simul_board.session
+        simul_board.search = None
+        session.ai_thinking = False
+        try:
+            ai_move = search.result()
+        except Exception as e:
+            print(f"Error getting AI move: {e}")
+            ai_move = None
+        if ai_move is None or ai_move not in session.board.legal_moves:
+            ai_move = random.choice(list(session.board.legal_moves))
+        session.push(ai_move)
+        finish_move(simul_board)
+        simul_board.dirty = True
+
+def run(count, width, height, difficulty, theme, engines):
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption(f"Python Chess - Simul ({count} boards)")
+    screen.fill(PANEL_COLOR)
+    pygame.display.flip()
+
+    rects, square_size = layout(count, width, height)
+    renderer = BoardRenderer(theme, square_size)
+    overlays = {}
+    for name, color in (("selected", HIGHLIGHT), ("target", (100, 255, 100, 100))):
+        overlays[name] = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        overlays[name].fill(color)
+
+    boards = []
+    for index, rect in enumerate(rects):
+        boards.append(SimulBoard(index, GameSession(difficulty=difficulty, theme=theme), rect))
+
+    pool = EnginePool(engines or min(count, len(host_cpus())), difficulty)
+    clock = pygame.time.Clock()
+    running = True
+    try:
+        while running:
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    running = False
+                elif event.type == MOUSEBUTTONDOWN:
+                    for simul_board in boards:
+                        if simul_board.rect.collidepoint(event.pos):
+                            handle_click(simul_board, simul_board.square_at(event.pos, square_size), pool)
+
+            apply_searches(boards)
+
+            # Only boards that changed are redrawn and pushed to the display
+            changed = [draw_simul_board(screen, renderer, overlays, b) for b in boards if b.dirty]
+            if changed:
+                pygame.display.update(changed)
+            clock.tick(FPS)
+    finally:
+        pool.close()
+        pygame.quit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play several boards against the AI at once")
+    parser.add_argument("-n", "--boards", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("-d", "--difficulty", default="Easy", choices=list(DIFFICULTY_SETTINGS))
+    parser.add_argument("-t", "--theme", default="Classic", choices=list(THEMES))
+    parser.add_argument("-e", "--engines", type=int, help="engine processes (default: one per core, up to the board count)")
+    args = parser.parse_args(argv)
+    run(args.boards, args.width, args.height, args.difficulty, args.theme, args.engines)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())